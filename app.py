@@ -1,13 +1,20 @@
 # NGC License Server - Complete Flask Application with Account Binding
 # FIXED VERSION - Added account binding security + Database initialization
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import sqlite3
 import hashlib
+import hmac
 import secrets
 import os
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+import queue
+from collections import OrderedDict
+from datetime import datetime, timedelta, date
 
 app = Flask(__name__)
 
@@ -20,18 +27,155 @@ CORS(app, resources={
     }
 })
 
+# Payloads here are two short fields; reject anything oversized up front
+app.config['MAX_CONTENT_LENGTH'] = 4096
+
+@app.errorhandler(413)
+def _body_too_large(e):
+    return jsonify({
+        'success': False,
+        'message': 'Request body too large'
+    }), 413
+
 # Database file
 DATABASE = 'licenses.db'
 
+# Admin key is read once at startup; compared constant-time per request
+ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
+
 #━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # DATABASE FUNCTIONS
 #━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
+def _connect():
+    """Open a database connection tuned for concurrent workers"""
+    conn = sqlite3.connect(DATABASE, timeout=5.0, isolation_level=None, check_same_thread=False,
+                           cached_statements=128)
+    # Wait up to 5s on a locked database instead of failing immediately
+    conn.execute('PRAGMA busy_timeout=5000')
+    # Per-connection setting (unlike journal_mode it does not persist in the
+    # file): NORMAL skips the per-commit WAL fsync that FULL would pay
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+# One connection per worker thread, reused across requests so the SQLite
+# page cache and statement cache survive between calls
+_db_local = threading.local()
+
+@app.before_request
+def _get_db():
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = _db_local.conn = _connect()
+    g.db = conn
+
+# Short-lived LRU of successful validations - EAs re-validate the same key
+# every few minutes, so most /validate calls can skip the database entirely
+_CACHE_TTL = 60
+_CACHE_MAX = 4096
+_cache = OrderedDict()  # license_key -> (expires_at, response_dict)
+_cache_lock = threading.Lock()
+
+def _cache_get(license_key):
+    """Return the cached validation response for a key, or None"""
+    with _cache_lock:
+        entry = _cache.get(license_key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del _cache[license_key]
+            return None
+        _cache.move_to_end(license_key)
+        return entry[1]
+
+def _cache_put(license_key, response):
+    """Cache a successful validation response for _CACHE_TTL seconds"""
+    with _cache_lock:
+        _cache[license_key] = (time.time() + _CACHE_TTL, response)
+        _cache.move_to_end(license_key)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+
+def _cache_invalidate(license_key):
+    """Drop a key from the validation cache after its license changes"""
+    with _cache_lock:
+        _cache.pop(license_key, None)
+
+# Validation log rows are queued here and written in batches by a single
+# background thread, so /validate never blocks on a log insert
+_log_q = queue.Queue(maxsize=10000)
+
+def _log_validation(license_key, ip_address, account_number, result):
+    """Queue a validation_logs row; drops the row if the queue is full"""
+    try:
+        _log_q.put_nowait((license_key, datetime.now().isoformat(), ip_address, account_number, result))
+    except queue.Full:
+        pass
+
+def _drain_logs():
+    """Background writer: batch up to 100 queued log rows per transaction"""
+    conn = _connect()
+    while True:
+        rows = [_log_q.get()]
+        deadline = time.time() + 0.2
+        while len(rows) < 100:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_log_q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Explicit transaction: with isolation_level=None executemany would
+        # autocommit (and fsync) once per row, not once per batch
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(_SQL_INS_LOG, rows)
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            print(f"Error writing validation logs: {str(e)}")
+
+_log_writer = threading.Thread(target=_drain_logs, name='validation-log-writer', daemon=True)
+_log_writer.start()
+
+# Bump whenever init_db() grows a new table, column or index
+_SCHEMA_VERSION = 3
+
 def init_db():
     """Initialize the database with necessary tables"""
-    conn = sqlite3.connect(DATABASE)
+    conn = _connect()
     c = conn.cursor()
-    
+
+    # WAL mode lets readers proceed while a writer commits; it persists in
+    # the db file and cannot be changed inside a transaction, so set it first
+    c.execute('PRAGMA journal_mode=WAL')
+
+    # Take the write lock before the version check so that when several
+    # gunicorn workers import the module concurrently, exactly one runs the
+    # DDL and the rest see the stamped version and skip it
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        if c.execute('PRAGMA user_version').fetchone()[0] == _SCHEMA_VERSION:
+            c.execute('COMMIT')
+            conn.close()
+            return
+
+        _create_schema(c)
+        c.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+        c.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            c.execute('ROLLBACK')
+        conn.close()
+        raise
+
+    conn.close()
+    print("✅ Database initialized")
+
+def _create_schema(c):
+    """Create tables and indexes and apply pending migrations"""
     # Create licenses table
     c.execute('''
         CREATE TABLE IF NOT EXISTS licenses (
@@ -59,28 +203,93 @@ def init_db():
             result TEXT
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    print("✅ Database initialized")
 
-def generate_license_key():
-    """Generate a unique license key"""
-    # Format: NGC-XXXX-XXXX-XXXX-XXXX
-    parts = []
-    for i in range(4):
-        part = secrets.token_hex(2).upper()
-        parts.append(part)
-    return f"NGC-{'-'.join(parts)}"
+    # Migration: integer days-since-epoch expiry so /stats can do a raw
+    # numeric compare instead of calling date() per row
+    c.execute('PRAGMA table_info(licenses)')
+    columns = [row[1] for row in c.fetchall()]
+    if 'expiry_epoch' not in columns:
+        c.execute('ALTER TABLE licenses ADD COLUMN expiry_epoch INTEGER')
+    c.execute('''
+        UPDATE licenses
+        SET expiry_epoch = CAST(julianday(expiry_date) - 2440587.5 AS INTEGER)
+        WHERE expiry_epoch IS NULL
+    ''')
+
+    # Indexes for the hot lookups in /stats (logs by day, licenses by expiry/status)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON validation_logs(timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_lic_epoch ON licenses(expiry_epoch)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_lic_status ON licenses(status)')
+
+    # expiry_epoch superseded the TEXT expiry_date index - no query uses it
+    # anymore, so stop paying for it on every insert/update
+    c.execute('DROP INDEX IF EXISTS idx_lic_expiry')
+
+def _parse_ymd(s):
+    """Parse a 'YYYY-MM-DD' string without the locale-aware strptime machinery"""
+    return date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _epoch_day(d):
+    """Days since 1970-01-01 for a date"""
+    return d.toordinal() - _EPOCH_ORDINAL
+
+# Well-formed keys only: reject junk/scan traffic before it costs a DB
+# probe or a log row
+_KEY_RE = re.compile(r'^NGC(?:-[0-9A-F]{4}){4}$')
+
+def generate_license_keys(count=1):
+    """Generate unique license keys - one urandom draw covers the whole batch"""
+    # Format: NGC-XXXX-XXXX-XXXX-XXXX, 16 hex chars per key
+    blob = secrets.token_hex(8 * count).upper()
+    return [f"NGC-{blob[i:i + 4]}-{blob[i + 4:i + 8]}-{blob[i + 8:i + 12]}-{blob[i + 12:i + 16]}"
+            for i in range(0, 16 * count, 16)]
+
+#━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# SQL STATEMENTS
+#━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Hot-path SQL lives in shared constants so every execute() hands the
+# statement cache the exact same text and reuses the compiled statement
+
+_SQL_VALIDATE_HOT = '''
+    UPDATE licenses
+    SET last_validated = ?
+    WHERE license_key = ? AND account_number = ?
+      AND status = 'active' AND expiry_date > ?
+    RETURNING email, product, expiry_date, status
+'''
+
+_SQL_GET_LICENSE = '''
+    SELECT license_key, email, product, expiry_date, status, activations, max_activations, account_number
+    FROM licenses
+    WHERE license_key = ?
+'''
+
+_SQL_BIND_ACCOUNT = '''
+    UPDATE licenses
+    SET account_number = ?, activations = 1, last_validated = ?
+    WHERE license_key = ?
+'''
+
+_SQL_TOUCH_VALIDATED = '''
+    UPDATE licenses
+    SET last_validated = ?
+    WHERE license_key = ?
+'''
+
+_SQL_INS_LOG = '''
+    INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
+    VALUES (?, ?, ?, ?, ?)
+'''
 
 #━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 # API ENDPOINTS
 #━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-@app.route('/')
-def home():
-    """Home page - shows server is running"""
-    return """
+# Pre-encoded once at import so GET / serves the bytes without re-building
+# or re-encoding the page per request
+_HOME_HTML = """
     <html>
         <head>
             <title>NGC License Server</title>
@@ -110,7 +319,12 @@ def home():
             <p><em>Next Generation Capital - License Management System</em></p>
         </body>
     </html>
-    """
+    """.encode('utf-8')
+
+@app.route('/')
+def home():
+    """Home page - shows server is running"""
+    return Response(_HOME_HTML, mimetype='text/html')
 
 @app.route('/validate', methods=['POST'])
 def validate_license():
@@ -132,10 +346,13 @@ def validate_license():
     }
     """
     try:
-        data = request.json
+        data = request.get_json(silent=True, cache=False) or {}
         license_key = data.get('license_key', '').strip().upper()
         account_number = str(data.get('account_number', '')).strip()
         ip_address = request.remote_addr
+        now = datetime.now()
+        now_iso = now.isoformat()
+        today = now.date()
         
         if not license_key:
             return jsonify({
@@ -149,27 +366,56 @@ def validate_license():
                 'message': 'Account number is required'
             }), 400
         
-        # Connect to database
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        # Get license info including account_number
-        c.execute('''
-            SELECT license_key, email, product, expiry_date, status, activations, max_activations, account_number
-            FROM licenses 
-            WHERE license_key = ?
-        ''', (license_key,))
+        if not _KEY_RE.match(license_key):
+            return jsonify({
+                'valid': False,
+                'message': 'Invalid key format'
+            }), 400
         
+        # Cache hit: recently validated and still bound to this account
+        cached = _cache_get(license_key)
+        if cached and cached['account_number'] == account_number:
+            _log_validation(license_key, ip_address, account_number, 'SUCCESS')
+            return jsonify(cached)
+
+        # Connect to database
+        c = g.db.cursor()
+
+        # Hot path: bound + active + unexpired license, touched in a single
+        # UPDATE...RETURNING so the row is located exactly once
+        c.execute(_SQL_VALIDATE_HOT, (now_iso, license_key, account_number, today.isoformat()))
+
+        row = c.fetchone()
+
+        if row:
+            email, product, expiry_date, status = row
+
+            # Log successful validation
+            _log_validation(license_key, ip_address, account_number, 'SUCCESS')
+
+            expiry = _parse_ymd(expiry_date)
+
+            response = {
+                'valid': True,
+                'expires': expiry_date,
+                'status': status,
+                'product': product,
+                'message': 'License valid',
+                'days_remaining': (expiry - today).days,
+                'is_activated': True,
+                'account_number': account_number
+            }
+            _cache_put(license_key, response)
+            return jsonify(response)
+
+        # Miss: run the diagnostic SELECT only on this path to find out why
+        c.execute(_SQL_GET_LICENSE, (license_key,))
+
         result = c.fetchone()
         
         if not result:
             # Log failed validation
-            c.execute('''
-                INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (license_key, datetime.now().isoformat(), ip_address, account_number, 'NOT_FOUND'))
-            conn.commit()
-            conn.close()
+            _log_validation(license_key, ip_address, account_number, 'NOT_FOUND')
             
             return jsonify({
                 'valid': False,
@@ -182,22 +428,12 @@ def validate_license():
         # 🔒 ACCOUNT BINDING SECURITY CHECK
         if bound_account is None or bound_account == '':
             # First time validation - bind this account to the license
-            c.execute('''
-                UPDATE licenses 
-                SET account_number = ?, activations = 1, last_validated = ?
-                WHERE license_key = ?
-            ''', (account_number, datetime.now().isoformat(), license_key))
-            conn.commit()
+            c.execute(_SQL_BIND_ACCOUNT, (account_number, now_iso, license_key))
             print(f"✅ License {license_key} bound to account {account_number}")
             
         elif bound_account != account_number:
             # Different account trying to use this license - REJECT
-            c.execute('''
-                INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (license_key, datetime.now().isoformat(), ip_address, account_number, 'ACCOUNT_MISMATCH'))
-            conn.commit()
-            conn.close()
+            _log_validation(license_key, ip_address, account_number, 'ACCOUNT_MISMATCH')
             
             return jsonify({
                 'valid': False,
@@ -206,14 +442,9 @@ def validate_license():
             })
         
         # Check if expired
-        expiry = datetime.strptime(expiry_date, '%Y-%m-%d')
-        if expiry < datetime.now():
-            c.execute('''
-                INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (license_key, datetime.now().isoformat(), ip_address, account_number, 'EXPIRED'))
-            conn.commit()
-            conn.close()
+        expiry = _parse_ymd(expiry_date)
+        if expiry <= today:
+            _log_validation(license_key, ip_address, account_number, 'EXPIRED')
             
             return jsonify({
                 'valid': False,
@@ -223,12 +454,7 @@ def validate_license():
         
         # Check if active
         if status != 'active':
-            c.execute('''
-                INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (license_key, datetime.now().isoformat(), ip_address, account_number, 'INACTIVE'))
-            conn.commit()
-            conn.close()
+            _log_validation(license_key, ip_address, account_number, 'INACTIVE')
             
             return jsonify({
                 'valid': False,
@@ -236,33 +462,27 @@ def validate_license():
             })
         
         # Update last validated time
-        c.execute('''
-            UPDATE licenses 
-            SET last_validated = ? 
-            WHERE license_key = ?
-        ''', (datetime.now().isoformat(), license_key))
+        c.execute(_SQL_TOUCH_VALIDATED, (now_iso, license_key))
         
         # Log successful validation
-        c.execute('''
-            INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (license_key, datetime.now().isoformat(), ip_address, account_number, 'SUCCESS'))
-        
-        conn.commit()
-        conn.close()
-        
+        _log_validation(license_key, ip_address, account_number, 'SUCCESS')
+
         # Return success
-        return jsonify({
+        response = {
             'valid': True,
             'expires': expiry_date,
             'status': status,
             'product': product,
             'message': 'License valid',
-            'days_remaining': (expiry - datetime.now()).days,
+            'days_remaining': (expiry - today).days,
             'is_activated': True,
             'account_number': account_number
-        })
+        }
+        _cache_put(license_key, response)
+        return jsonify(response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in validate: {str(e)}")
         return jsonify({
@@ -282,7 +502,7 @@ def activate_license():
     }
     """
     try:
-        data = request.json
+        data = request.get_json(silent=True, cache=False) or {}
         license_key = data.get('license_key', '').strip().upper()
         account_number = str(data.get('account_number', '')).strip()
         
@@ -298,8 +518,13 @@ def activate_license():
                 'message': 'Account number is required'
             }), 400
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
+        if not _KEY_RE.match(license_key):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid key format'
+            }), 400
+        
+        c = g.db.cursor()
         
         # Get current activation count and bound account
         c.execute('''
@@ -311,7 +536,6 @@ def activate_license():
         result = c.fetchone()
         
         if not result:
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': 'License not found'
@@ -320,7 +544,6 @@ def activate_license():
         activations, max_activations, status, bound_account = result
         
         if status != 'active':
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': f'License is {status}'
@@ -328,14 +551,12 @@ def activate_license():
         
         # Check if already bound to different account
         if bound_account and bound_account != account_number:
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': f'License already activated on a different account'
             })
         
         if activations >= max_activations:
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': f'Maximum activations ({max_activations}) reached'
@@ -347,10 +568,8 @@ def activate_license():
             SET activations = activations + 1, account_number = ?
             WHERE license_key = ?
         ''', (account_number, license_key))
-        
-        conn.commit()
-        conn.close()
-        
+        _cache_invalidate(license_key)
+
         return jsonify({
             'success': True,
             'message': 'License activated successfully',
@@ -358,6 +577,8 @@ def activate_license():
             'activations_remaining': max_activations - (activations + 1)
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in activate: {str(e)}")
         return jsonify({
@@ -375,57 +596,79 @@ def generate_license():
         "email": "customer@example.com",
         "product": "NGC_Scalping",
         "duration_days": 365,
-        "max_activations": 1
+        "max_activations": 1,
+        "count": 1
     }
-    
+
+    Optional "count" (up to 1000) mints a batch of keys in one transaction.
     Optional auth header: X-API-Key
     """
     try:
         # Simple API key protection
         api_key = request.headers.get('X-API-Key')
-        ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
         
-        if api_key != ADMIN_API_KEY:
+        if not api_key or not hmac.compare_digest(api_key, ADMIN_API_KEY):
             return jsonify({
                 'success': False,
                 'message': 'Unauthorized'
             }), 401
         
-        data = request.json
+        data = request.get_json(silent=True, cache=False) or {}
         email = data.get('email', '').strip()
         product = data.get('product', 'NGC_EA')
         duration_days = data.get('duration_days', 365)
         max_activations = data.get('max_activations', 1)
-        
+        count = data.get('count', 1)
+
         if not email:
             return jsonify({
                 'success': False,
                 'message': 'Email is required'
             }), 400
-        
-        # Generate license key
-        license_key = generate_license_key()
-        
+
+        if not isinstance(count, int) or not 1 <= count <= 1000:
+            return jsonify({
+                'success': False,
+                'message': 'count must be an integer between 1 and 1000'
+            }), 400
+
         # Calculate expiry date
-        created_date = datetime.now().strftime('%Y-%m-%d')
-        expiry_date = (datetime.now() + timedelta(days=duration_days)).strftime('%Y-%m-%d')
-        
-        # Insert into database
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        c.execute('''
-            INSERT INTO licenses 
-            (license_key, email, product, created_date, expiry_date, status, activations, max_activations, account_number)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (license_key, email, product, created_date, expiry_date, 'active', 0, max_activations, None))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ License generated: {license_key} for {email}")
-        
-        return jsonify({
+        now = datetime.now()
+        created_date = now.strftime('%Y-%m-%d')
+        expiry = (now + timedelta(days=duration_days)).date()
+        expiry_date = expiry.strftime('%Y-%m-%d')
+        expiry_epoch = _epoch_day(expiry)
+
+        license_keys = generate_license_keys(count)
+        rows = []
+        for key in license_keys:
+            rows.append((key, email, product, created_date, expiry_date, expiry_epoch,
+                         'active', 0, max_activations, None))
+            _cache_invalidate(key)
+
+        # Insert into database under an explicit transaction: the connection
+        # autocommits per statement (isolation_level=None), so without BEGIN
+        # a mid-batch failure would leave earlier keys durably minted while
+        # the admin is told the request failed
+        c = g.db.cursor()
+
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            c.executemany('''
+                INSERT INTO licenses
+                (license_key, email, product, created_date, expiry_date, expiry_epoch, status, activations, max_activations, account_number)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            c.execute('COMMIT')
+        except Exception:
+            if g.db.in_transaction:
+                c.execute('ROLLBACK')
+            raise
+
+        license_key = license_keys[0]
+        print(f"✅ {count} license(s) generated for {email}")
+
+        response = {
             'success': True,
             'license_key': license_key,
             'email': email,
@@ -433,8 +676,14 @@ def generate_license():
             'created': created_date,
             'expires': expiry_date,
             'max_activations': max_activations
-        })
-        
+        }
+        if count > 1:
+            response['count'] = count
+            response['license_keys'] = license_keys
+        return jsonify(response)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in generate: {str(e)}")
         import traceback
@@ -452,8 +701,13 @@ def check_license(license_key):
     try:
         license_key = license_key.strip().upper()
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
+        if not _KEY_RE.match(license_key):
+            return jsonify({
+                'found': False,
+                'message': 'Invalid key format'
+            }), 400
+        
+        c = g.db.cursor()
         
         c.execute('''
             SELECT email, product, created_date, expiry_date, status, activations, max_activations, last_validated, account_number
@@ -462,7 +716,6 @@ def check_license(license_key):
         ''', (license_key,))
         
         result = c.fetchone()
-        conn.close()
         
         if not result:
             return jsonify({
@@ -473,9 +726,10 @@ def check_license(license_key):
         email, product, created, expiry, status, activations, max_activations, last_validated, account_number = result
         
         # Check if expired
-        expiry_date = datetime.strptime(expiry, '%Y-%m-%d')
-        is_expired = expiry_date < datetime.now()
-        days_remaining = (expiry_date - datetime.now()).days
+        today = date.today()
+        expiry_date = _parse_ymd(expiry)
+        is_expired = expiry_date <= today
+        days_remaining = (expiry_date - today).days
         
         return jsonify({
             'found': True,
@@ -492,6 +746,8 @@ def check_license(license_key):
             'bound_account': account_number if account_number else 'Not activated yet'
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in check: {str(e)}")
         return jsonify({
@@ -504,13 +760,11 @@ def list_licenses():
     """Get all licenses (admin function)"""
     try:
         api_key = request.headers.get('X-API-Key')
-        ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
         
-        if api_key != ADMIN_API_KEY:
+        if not api_key or not hmac.compare_digest(api_key, ADMIN_API_KEY):
             return jsonify({'error': 'Unauthorized'}), 401
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
+        c = g.db.cursor()
         
         # Get all licenses with details
         c.execute('''
@@ -521,17 +775,17 @@ def list_licenses():
         ''')
         
         results = c.fetchall()
-        conn.close()
         
+        today = date.today()
         licenses = []
         for row in results:
             license_key, email, product, created, expiry, status, activations, max_activations, last_validated, account_number = row
             
             # Calculate if expired
             try:
-                expiry_date = datetime.strptime(expiry, '%Y-%m-%d')
-                is_expired = expiry_date < datetime.now()
-                days_remaining = (expiry_date - datetime.now()).days
+                expiry_date = _parse_ymd(expiry)
+                is_expired = expiry_date <= today
+                days_remaining = (expiry_date - today).days
             except:
                 is_expired = False
                 days_remaining = 0
@@ -556,6 +810,8 @@ def list_licenses():
             'licenses': licenses
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in list: {str(e)}")
         return jsonify({'error': 'Server error'}), 500
@@ -565,33 +821,28 @@ def get_stats():
     """Get basic statistics (admin function)"""
     try:
         api_key = request.headers.get('X-API-Key')
-        ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
         
-        if api_key != ADMIN_API_KEY:
+        if not api_key or not hmac.compare_digest(api_key, ADMIN_API_KEY):
             return jsonify({'error': 'Unauthorized'}), 401
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        # Total licenses
-        c.execute('SELECT COUNT(*) FROM licenses')
-        total_licenses = c.fetchone()[0]
+        c = g.db.cursor()
         
-        # Active licenses
-        c.execute("SELECT COUNT(*) FROM licenses WHERE status = 'active'")
-        active_licenses = c.fetchone()[0]
-        
-        # Expired licenses
-        c.execute("SELECT COUNT(*) FROM licenses WHERE expiry_date < date('now')")
-        expired_licenses = c.fetchone()[0]
-        
-        # Total validations today
+        # License counters in one pass over the table (conditional SUMs)
+        c.execute('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(status = 'active'), 0),
+                   COALESCE(SUM(expiry_epoch < ?), 0)
+            FROM licenses
+        ''', (_epoch_day(date.today()),))
+        total_licenses, active_licenses, expired_licenses = c.fetchone()
+        
+        # Total validations today - range predicate so idx_logs_ts can seek
         today = datetime.now().strftime('%Y-%m-%d')
-        c.execute("SELECT COUNT(*) FROM validation_logs WHERE timestamp LIKE ?", (f'{today}%',))
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        c.execute("SELECT COUNT(*) FROM validation_logs WHERE timestamp >= ? AND timestamp < ?",
+                  (today, tomorrow))
         validations_today = c.fetchone()[0]
         
-        conn.close()
-        
         return jsonify({
             'total_licenses': total_licenses,
             'active_licenses': active_licenses,
@@ -599,6 +850,8 @@ def get_stats():
             'validations_today': validations_today
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in stats: {str(e)}")
         return jsonify({'error': 'Server error'}), 500
@@ -608,15 +861,14 @@ def unbind_license():
     """Unbind a license from its account (ADMIN ONLY)"""
     try:
         api_key = request.headers.get('X-API-Key')
-        ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
         
-        if api_key != ADMIN_API_KEY:
+        if not api_key or not hmac.compare_digest(api_key, ADMIN_API_KEY):
             return jsonify({
                 'success': False,
                 'message': 'Unauthorized - Admin API key required'
             }), 401
         
-        data = request.json
+        data = request.get_json(silent=True, cache=False) or {}
         license_key = data.get('license_key', '').strip().upper()
         reason = data.get('reason', 'Manual unbind by admin')
         
@@ -626,8 +878,7 @@ def unbind_license():
                 'message': 'License key is required'
             }), 400
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
+        c = g.db.cursor()
         
         c.execute('''
             SELECT license_key, account_number, email, product, status
@@ -638,7 +889,6 @@ def unbind_license():
         result = c.fetchone()
         
         if not result:
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': 'License not found'
@@ -647,7 +897,6 @@ def unbind_license():
         key, bound_account, email, product, status = result
         
         if bound_account is None or bound_account == '':
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': 'License is already unbound'
@@ -660,15 +909,13 @@ def unbind_license():
             SET account_number = NULL, activations = 0
             WHERE license_key = ?
         ''', (license_key,))
+        _cache_invalidate(license_key)
         
         c.execute('''
             INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
             VALUES (?, ?, ?, ?, ?)
         ''', (license_key, datetime.now().isoformat(), request.remote_addr, previous_account, f'UNBIND: {reason}'))
         
-        conn.commit()
-        conn.close()
-        
         print(f"🔓 LICENSE UNBOUND: {license_key} from account {previous_account}")
         
         return jsonify({
@@ -681,6 +928,8 @@ def unbind_license():
             'status': 'License is now available for activation on any account'
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in unbind: {str(e)}")
         return jsonify({
@@ -693,15 +942,14 @@ def rebind_license():
     """Rebind a license to a specific account (ADMIN ONLY)"""
     try:
         api_key = request.headers.get('X-API-Key')
-        ADMIN_API_KEY = os.environ.get('ADMIN_API_KEY', 'WX81849888')
         
-        if api_key != ADMIN_API_KEY:
+        if not api_key or not hmac.compare_digest(api_key, ADMIN_API_KEY):
             return jsonify({
                 'success': False,
                 'message': 'Unauthorized - Admin API key required'
             }), 401
         
-        data = request.json
+        data = request.get_json(silent=True, cache=False) or {}
         license_key = data.get('license_key', '').strip().upper()
         new_account = str(data.get('new_account', '')).strip()
         reason = data.get('reason', 'Manual rebind by admin')
@@ -712,8 +960,7 @@ def rebind_license():
                 'message': 'Both license_key and new_account are required'
             }), 400
         
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
+        c = g.db.cursor()
         
         c.execute('''
             SELECT license_key, account_number, email, product, status
@@ -724,7 +971,6 @@ def rebind_license():
         result = c.fetchone()
         
         if not result:
-            conn.close()
             return jsonify({
                 'success': False,
                 'message': 'License not found'
@@ -732,21 +978,21 @@ def rebind_license():
         
         key, old_account, email, product, status = result
         
+        now_iso = datetime.now().isoformat()
+        
         c.execute('''
             UPDATE licenses 
             SET account_number = ?, activations = 1, last_validated = ?
             WHERE license_key = ?
-        ''', (new_account, datetime.now().isoformat(), license_key))
+        ''', (new_account, now_iso, license_key))
+        _cache_invalidate(license_key)
         
         c.execute('''
             INSERT INTO validation_logs (license_key, timestamp, ip_address, account_number, result)
             VALUES (?, ?, ?, ?, ?)
-        ''', (license_key, datetime.now().isoformat(), request.remote_addr, new_account, 
+        ''', (license_key, now_iso, request.remote_addr, new_account, 
               f'REBIND: {old_account if old_account else "unbound"} → {new_account}. Reason: {reason}'))
         
-        conn.commit()
-        conn.close()
-        
         print(f"🔄 LICENSE REBOUND: {license_key} from {old_account} to {new_account}")
         
         return jsonify({
@@ -759,6 +1005,8 @@ def rebind_license():
             'product': product
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in rebind: {str(e)}")
         return jsonify({
@@ -779,4 +1027,6 @@ if __name__ == '__main__':
     print(f"🚀 NGC License Server starting on port {port}")
     print(f"📊 Database: {DATABASE}")
     print(f"✅ Server ready!")
-    app.run(host='0.0.0.0', port=port, debug=False)
+    # Local/dev fallback only - production runs under gunicorn with
+    # gthread workers (see render.yaml) for real request concurrency
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)